@@ -1,12 +1,16 @@
-import json
 import os
 
-from models import Status
+from models import Report, Status
 from repository import update_report_status
 from logger import get_logger
 
 logger = get_logger("dlq_handler")
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 AWS_REGION = os.environ.get("AWS_REGION", "ap-south-2")
 
 
@@ -17,17 +21,18 @@ def lambda_handler(event, context):
 
     for idx, record in enumerate(event["Records"]):
         try:
-            body = json.loads(record["body"])
+            body = record["body"]
 
-            # DLQ messages may be wrapped (original record from main lambda)
+            # DLQ messages may be wrapped (original record from main lambda, as JSON)
             # or raw report messages — handle both
-            if "body" in body:
-                inner = json.loads(body["body"])
-            else:
-                inner = body
-
-            report_id = inner["report_id"]
-            batch_no = inner["batch_no"]
+            if body.startswith("{"):
+                wrapped = _json_loads(body)
+                if "body" in wrapped:
+                    body = wrapped["body"]
+
+            report = Report.from_message(body)
+            report_id = report.report_id
+            batch_no = report.batch_no
 
             log = logger.bind(report_id=report_id, batch_no=batch_no, index=idx + 1, total=total_records)
             log.info("Marking as FAILED")
@@ -3,4 +3,8 @@ class TickerNotFoundException(Exception):
 
 
 class InvalidTickerException(TickerNotFoundException):
-    pass
\ No newline at end of file
+    pass
+
+
+class InsufficientMarketDataException(Exception):
+    pass
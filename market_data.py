@@ -1,9 +1,15 @@
 import os
+import random
+import time
 import boto3
-import yfinance as yf
+import numpy as np
+import pandas as pd
+from botocore.config import Config
 from datetime import datetime
 from decimal import Decimal
-from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from logger import get_logger
 
 logger = get_logger("market_data")
@@ -18,8 +24,18 @@ AWS_REGION = os.environ.get("AWS_REGION", "ap-south-2")
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY", "")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_KEY", "")
 MARKET_TABLE_NAME = os.environ.get("MARKET_TABLE_NAME", "markets")
-
-kwargs = {}
+MARKET_SNAPSHOT_BUCKET = os.environ.get("MARKET_SNAPSHOT_BUCKET", os.environ.get("S3_BUCKET_NAME"))
+MARKET_SNAPSHOT_KEY = os.environ.get("MARKET_SNAPSHOT_KEY", "market_snapshot.parquet")
+
+kwargs = {
+    "config": Config(
+        tcp_keepalive=True,
+        max_pool_connections=50,
+        retries={"mode": "adaptive", "max_attempts": 5},
+        connect_timeout=1,
+        read_timeout=3,
+    ),
+}
 if AWS_ACCESS_KEY_ID:
     kwargs['aws_access_key_id'] = AWS_ACCESS_KEY_ID
 
@@ -28,6 +44,16 @@ if AWS_SECRET_ACCESS_KEY:
 
 dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION, **kwargs)
 market_table = dynamodb.Table(MARKET_TABLE_NAME)
+s3_client = boto3.client("s3", region_name=AWS_REGION, **kwargs)
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_MAX_KEYS = 100
+
+# UnprocessedKeys mean the table is throttling, and botocore's retries do not cover
+# partial results, so resends back off exponentially (full jitter) for a bounded count
+BATCH_GET_MAX_ATTEMPTS = 5
+BATCH_GET_BACKOFF_BASE_SECONDS = 0.05
+BATCH_GET_BACKOFF_MAX_SECONDS = 1.0
 
 ALL_TICKERS = [
     'AAPL', 'MSFT', 'GOOGL', 'TSLA', 'NVDA', 'SPY',
@@ -41,78 +67,130 @@ ALL_TICKERS = [
 ]
 
 
-def _convert_floats(obj):
-    """Convert float values to Decimal for DynamoDB compatibility."""
-    if isinstance(obj, float):
-        return Decimal(str(obj))
-    if isinstance(obj, dict):
-        return {k: _convert_floats(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_convert_floats(i) for i in obj]
-    return obj
+_PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
 
 
-def store_ticker_data(ticker, hist, period='2mo'):
-    """Store a ticker's dataframe into the markets table."""
-    records = []
-    for date, row in hist.iterrows():
-        records.append({
-            "date": date.strftime('%Y-%m-%d'),
-            "Open": float(row["Open"]),
-            "High": float(row["High"]),
-            "Low": float(row["Low"]),
-            "Close": float(row["Close"]),
-            "Volume": int(row["Volume"]),
-        })
-
-    item = {
+def _build_records(hist):
+    """
+    Build the DynamoDB records for a ticker's dataframe column by column.
+    Prices go through their shortest float repr into Decimal, as DynamoDB has no float type.
+    """
+    columns = {"date": hist.index.strftime('%Y-%m-%d').tolist()}
+    for col in _PRICE_COLUMNS:
+        columns[col] = list(map(Decimal, hist[col].to_numpy(dtype=np.float64).astype(str)))
+    columns["Volume"] = hist["Volume"].to_numpy(dtype=np.int64).tolist()
+
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+
+def build_ticker_item(ticker, hist, period='2mo', updated_at=None):
+    """Build the markets table item for a ticker's dataframe."""
+    records = _build_records(hist)
+    return {
         "ticker": ticker,
         "period": period,
-        "records": _convert_floats(records),
+        "records": records,
         "record_count": len(records),
-        "updated_at": datetime.now().isoformat(),
+        "updated_at": updated_at or datetime.now().isoformat(),
         "is_valid": True,
     }
 
+
+def store_ticker_data(ticker, hist, period='2mo'):
+    """Store a ticker's dataframe into the markets table."""
+    item = build_ticker_item(ticker, hist, period)
     market_table.put_item(Item=item)
-    logger.info("Cached ticker data", ticker=ticker, record_count=len(records), source="db")
+    logger.info("Cached ticker data", ticker=ticker, record_count=item["record_count"], source="db")
+
 
+@lru_cache(maxsize=256)
+def _ticker(symbol):
+    # Reused across warm invocations; yfinance already shares one HTTP session between Tickers.
+    # Imported here so report workers importing this module for its DB helpers don't load yfinance.
+    import yfinance as yf
+    return yf.Ticker(symbol)
 
-def _fetch_and_store(ticker, period='2mo'):
+
+def _fetch_history(ticker, period='2mo'):
     try:
-        stock = yf.Ticker(ticker)
+        stock = _ticker(ticker)
         hist = stock.history(period=period)
 
         if hist.empty:
             logger.warning("No data returned", ticker=ticker)
-            return ticker, False
+            return ticker, None
 
-        store_ticker_data(ticker, hist, period)
-        logger.info("Ticker stored", ticker=ticker, record_count=len(hist))
-        return ticker, True
+        logger.info("Ticker fetched", ticker=ticker, record_count=len(hist))
+        return ticker, hist
 
     except Exception as e:
-        logger.error("Fetch and store failed", ticker=ticker, error=str(e))
-        return ticker, False
+        logger.error("Fetch failed", ticker=ticker, error=str(e))
+        return ticker, None
+
+
+def write_market_snapshot(histories):
+    """
+    Write every refreshed ticker into one long-format parquet object on S3
+    (columns: ticker, date, Open, High, Low, Close, Volume) so report workers
+    can load the whole market with a single GET instead of per-ticker reads.
+    """
+    frames = []
+    for ticker, hist in histories.items():
+        df = hist[["Open", "High", "Low", "Close", "Volume"]].copy()
+        index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+        df.index = index.normalize().rename("date")
+        frames.append(df.reset_index().assign(ticker=ticker))
+
+    snapshot = pd.concat(frames, ignore_index=True)
+    buf = BytesIO()
+    snapshot.to_parquet(buf, index=False)
+    s3_client.put_object(Bucket=MARKET_SNAPSHOT_BUCKET, Key=MARKET_SNAPSHOT_KEY, Body=buf.getvalue())
+    logger.info("Wrote market snapshot", ticker_count=len(histories), record_count=len(snapshot), s3_key=MARKET_SNAPSHOT_KEY)
 
 
 def refresh_all(tickers=None, period='2mo', max_workers=10):
     tickers = tickers or ALL_TICKERS
-    success = 0
+    histories = {}
     failed = []
 
     with ThreadPoolExecutor(max_workers=max_workers) as pool:
-        futures = {pool.submit(_fetch_and_store, t, period): t for t in tickers}
-        for future in futures:
-            ticker, ok = future.result()
-            if ok:
-                success += 1
+        futures = {pool.submit(_fetch_history, t, period): t for t in tickers}
+        for future in as_completed(futures):
+            ticker, hist = future.result()
+            if hist is not None:
+                histories[ticker] = hist
             else:
                 failed.append(ticker)
 
-    logger.info("Refresh complete", success_count=success, fail_count=len(failed), total=len(tickers), failed_tickers=failed)
-
-    return {"success": success, "failed": failed}
+    # The DB and the snapshot are written independently, so a failure in one
+    # does not leave the other stale while the fetched data is in hand
+    db_written = False
+    if histories:
+        try:
+            # One timestamp for the whole refresh — the items are written together
+            now = datetime.now().isoformat()
+            # batch_writer chunks the puts into 25-item BatchWriteItem calls and resends unprocessed items
+            with market_table.batch_writer() as writer:
+                for ticker, hist in histories.items():
+                    writer.put_item(Item=build_ticker_item(ticker, hist, period, now))
+            db_written = True
+            logger.info("Cached ticker data", ticker_count=len(histories), source="db")
+        except Exception as e:
+            logger.error("Batch store failed", ticker_count=len(histories), error=str(e))
+
+    snapshot_written = False
+    if histories and MARKET_SNAPSHOT_BUCKET:
+        try:
+            write_market_snapshot(histories)
+            snapshot_written = True
+        except Exception as e:
+            logger.error("Market snapshot write failed", error=str(e))
+
+    success = len(histories)
+    logger.info("Refresh complete", success_count=success, fail_count=len(failed), total=len(tickers),
+                failed_tickers=failed, db_written=db_written, snapshot_written=snapshot_written)
+
+    return {"success": success, "failed": failed, "db_written": db_written, "snapshot_written": snapshot_written}
 
 
 def mark_ticker_as_invalid(ticker):
@@ -134,6 +212,32 @@ def get_market_data(ticker):
     return response.get("Item")
 
 
+def get_market_data_batch(tickers):
+    """
+    Fetch cached market data for many tickers with BatchGetItem. Returns {ticker: item} for the hits.
+    Keys still unprocessed after BATCH_GET_MAX_ATTEMPTS are left out, so callers treat them as misses.
+    """
+    items = {}
+    unique = list(dict.fromkeys(tickers))
+
+    for start in range(0, len(unique), BATCH_GET_MAX_KEYS):
+        request = {MARKET_TABLE_NAME: {"Keys": [{"ticker": t} for t in unique[start:start + BATCH_GET_MAX_KEYS]]}}
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(random.uniform(0, min(BATCH_GET_BACKOFF_MAX_SECONDS, BATCH_GET_BACKOFF_BASE_SECONDS * 2 ** attempt)))
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get("Responses", {}).get(MARKET_TABLE_NAME, []):
+                items[item["ticker"]] = item
+            request = response.get("UnprocessedKeys")
+            if not request:
+                break
+        else:
+            skipped = [key["ticker"] for key in request[MARKET_TABLE_NAME]["Keys"]]
+            logger.warning("Unprocessed keys after retries", tickers=skipped, attempts=BATCH_GET_MAX_ATTEMPTS, source="db")
+
+    return items
+
+
 def lambda_handler(event, context):
     """Can be deployed as a scheduled Lambda via EventBridge."""
     result = refresh_all()
@@ -1,8 +1,12 @@
+import json
+from base64 import b64decode, b64encode
+from dataclasses import dataclass
 from enum import Enum
-from pydantic import BaseModel
 from typing import Optional
 
-class Status(Enum):
+import msgpack
+
+class Status(str, Enum):
     CREATED = 'CREATED'
     QUEUED = 'QUEUED'
     IN_PROGRESS = 'IN_PROGRESS'
@@ -11,10 +15,44 @@ class Status(Enum):
     REJECTED = 'REJECTED'
     FAILED = 'FAILED'
 
-class Report(BaseModel):
+@dataclass(slots=True)
+class Report:
     report_id: int
     batch_no: int
+    payload: dict
     status: Status = Status.CREATED
     s3_key: Optional[str] = None
-    payload: dict
-    error_msg: Optional[str] = None
\ No newline at end of file
+    error_msg: Optional[str] = None
+
+    @classmethod
+    def validate(cls, data: dict) -> "Report":
+        """Build a Report from a decoded message, coercing only the fields that arrive as JSON primitives."""
+        return cls(
+            report_id=int(data["report_id"]),
+            batch_no=int(data["batch_no"]),
+            payload=dict(data["payload"]),
+            status=Status(data.get("status", Status.CREATED)),
+            s3_key=data.get("s3_key"),
+            error_msg=data.get("error_msg"),
+        )
+
+    def to_json_dict(self) -> dict:
+        return {
+            "report_id": self.report_id,
+            "batch_no": self.batch_no,
+            "status": self.status,
+            "s3_key": self.s3_key,
+            "payload": self.payload,
+            "error_msg": self.error_msg,
+        }
+
+    def to_message(self) -> str:
+        """Encode as an SQS message body: msgpack, base64'd since SQS bodies must be text."""
+        return b64encode(msgpack.packb(self.to_json_dict())).decode()
+
+    @classmethod
+    def from_message(cls, body: str) -> "Report":
+        """Decode an SQS message body written by to_message (or a legacy JSON body)."""
+        if body.startswith("{"):
+            return cls.validate(json.loads(body))
+        return cls.validate(msgpack.unpackb(b64decode(body)))
@@ -1,11 +1,10 @@
-import json
 import os
 import random
 import boto3
 from datetime import datetime
 
 from models import Report, Status
-from repository import create_report, update_report_status
+from repository import create_reports_bulk, batch_update_report_status
 from logger import get_logger
 from dotenv import load_dotenv
 
@@ -18,6 +17,8 @@ AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY", "")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_KEY", "")
 
 SQS_QUEUE_URL = os.environ.get("SQS_QUEUE_URL")
+# SendMessageBatch accepts at most 10 entries per request
+SQS_BATCH_MAX_ENTRIES = 10
 
 sqs_client = boto3.client("sqs", region_name=AWS_REGION, aws_access_key_id=AWS_ACCESS_KEY_ID, aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
 
@@ -89,43 +90,64 @@ def get_random_portfolio(n=5, benchmark='SPY'):
     return portfolio
 
 
-def send_message(report: Report):
-    message_body = json.dumps(report.model_dump(mode="json"))
-    sqs_client.send_message(
-        QueueUrl=SQS_QUEUE_URL,
-        MessageBody=message_body,
-    )
+def send_message_batch(reports: list[Report]) -> list[dict]:
+    """
+    Sends up to SQS_BATCH_MAX_ENTRIES reports in one SendMessageBatch call.
+    Returns a status update per report — QUEUED if SQS accepted it, FAILED otherwise.
+    """
+    by_id = {str(report.report_id): report for report in reports}
+    try:
+        response = sqs_client.send_message_batch(
+            QueueUrl=SQS_QUEUE_URL,
+            Entries=[{"Id": entry_id, "MessageBody": report.to_message()} for entry_id, report in by_id.items()],
+        )
+    except Exception as e:
+        response = {"Failed": [{"Id": entry_id, "Message": str(e)} for entry_id in by_id]}
+
+    updates = []
+    for entry in response.get("Successful", []):
+        report = by_id[entry["Id"]]
+        updates.append({"report_id": report.report_id, "batch_no": report.batch_no, "status": Status.QUEUED})
+        logger.info("Sent report to queue", report_id=report.report_id, batch_no=report.batch_no, action="sqs_send")
+
+    for entry in response.get("Failed", []):
+        report = by_id[entry["Id"]]
+        updates.append({
+            "report_id": report.report_id,
+            "batch_no": report.batch_no,
+            "status": Status.FAILED,
+            "error_msg": "Failed to Send Message to Queue",
+        })
+        logger.error("Failed to send report to queue", report_id=report.report_id, batch_no=report.batch_no, action="sqs_send", error=entry.get("Message"))
+
+    return updates
 
 
 def main():
     batch_no = int(datetime.now().strftime('%Y%m%d%H%M%S'))
 
-    for i in range(100):
-        portfolio = get_random_portfolio()
-
-        report = Report(
+    reports = [
+        Report(
             report_id = i,
             batch_no = batch_no,
             status = Status.CREATED,
-            payload = portfolio,
+            payload = get_random_portfolio(),
         )
+        for i in range(100)
+    ]
 
-        # 1. Save to DB — skip if this report_id + batch_no already exists
-        _, created = create_report(report)
-        log = logger.bind(report_id=report.report_id, batch_no=batch_no)
-        if not created:
-            log.info("Report already exists, skipping", action="skip")
-            continue
-        log.info("Created report", action="db_create")
+    # 1. Save to DB in bulk — batch_no is fresh, so no report can already exist
+    create_reports_bulk(reports)
+    logger.info("Created reports", batch_no=batch_no, report_count=len(reports), action="db_create")
 
-        # 2. Try sending to SQS, update DB status accordingly
+    # 2. Send to SQS ten at a time, update DB statuses accordingly
+    for start in range(0, len(reports), SQS_BATCH_MAX_ENTRIES):
+        updates = send_message_batch(reports[start:start + SQS_BATCH_MAX_ENTRIES])
         try:
-            send_message(report)
-            update_report_status(report.report_id, report.batch_no, Status.QUEUED)
-            log.info("Sent report to queue", action="sqs_send")
+            batch_update_report_status(updates)
         except Exception as e:
-            update_report_status(report.report_id, report.batch_no, Status.FAILED, error_msg = "Failed to Send Message to Queue")
-            log.error("Failed to send report to queue", action="sqs_send", error=str(e))
+            # Keep sending the remaining batches; these rows stay CREATED
+            logger.error("Failed to update report statuses", batch_no=batch_no, report_ids=[u["report_id"] for u in updates], action="db_update", error=str(e))
 
 
 if __name__ == "__main__":
@@ -1,31 +1,36 @@
+import http.client
 import json
 import os
 from typing import Any
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from datetime import datetime
 from io import BytesIO
+import urllib3.connection
 
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 
 from models import Report, Status
-from repository import update_report_status, claim_report_for_processing
-from market_data import get_market_data, store_ticker_data, mark_ticker_as_invalid
-from exceptions import TickerNotFoundException, InvalidTickerException
+from repository import update_report_status, batch_update_report_status, claim_report_for_processing
+from market_data import get_market_data_batch, store_ticker_data, mark_ticker_as_invalid
+from exceptions import TickerNotFoundException, InvalidTickerException, InsufficientMarketDataException
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer, Image
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Spacer
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.charts.lineplots import LinePlot
 from reportlab.platypus import Paragraph
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import threading
+from collections import namedtuple
 import time
 import warnings
 
@@ -33,260 +38,537 @@ from logger import get_logger
 
 warnings.filterwarnings('ignore')
 
+try:
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    _json_dumps = json.dumps
+
 logger = get_logger("report_handler")
 
 DLQ_QUEUE_URL = os.environ.get("DLQ_QUEUE_URL")
 S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
 AWS_REGION = os.environ.get("AWS_REGION", "ap-south-2")
+MARKET_SNAPSHOT_BUCKET = os.environ.get("MARKET_SNAPSHOT_BUCKET", S3_BUCKET_NAME)
+MARKET_SNAPSHOT_KEY = os.environ.get("MARKET_SNAPSHOT_KEY", "market_snapshot.parquet")
+MARKET_CACHE_TTL_SECONDS = int(os.environ.get("MARKET_CACHE_TTL_SECONDS", "3600"))
 
 
-s3_client = boto3.client("s3", region_name=AWS_REGION)
-sqs_client = boto3.client("sqs")
+# http.client streams request bodies in 8 KiB blocks (urllib3 raises that to
+# 16 KiB); for PDF uploads a 1 MiB block size keeps the socket saturated.
+HTTP_BLOCKSIZE = 1024 * 1024
+_blocksize_patched = False
+
+
+def _raise_http_blocksize():
+    global _blocksize_patched
+    if _blocksize_patched:
+        return
+    http.client.HTTPConnection.__init__.__defaults__ = tuple(
+        HTTP_BLOCKSIZE if default == 8192 else default
+        for default in http.client.HTTPConnection.__init__.__defaults__
+    )
+    # botocore connects through urllib3, whose connections take blocksize keyword-only
+    for connection_cls in (urllib3.connection.HTTPConnection, urllib3.connection.HTTPSConnection):
+        connection_cls.__init__.__kwdefaults__["blocksize"] = HTTP_BLOCKSIZE
+    _blocksize_patched = True
+
+
+_raise_http_blocksize()
+
+# Reuse sockets across warm invocations; clients are module-level so the
+# pool survives between handler calls.
+_boto_config = Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={"mode": "adaptive", "max_attempts": 5},
+    connect_timeout=1,
+    read_timeout=3,
+)
+
+s3_client = boto3.client("s3", region_name=AWS_REGION, config=_boto_config)
+sqs_client = boto3.client("sqs", config=_boto_config)
+
+# Multipart kicks in above 8 MiB, so typical dashboards still go up in a single PUT
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
+)
 
 # Portfolio configuration
 
-def _fetch_single_ticker(ticker, period):
-    """Fetch a single ticker: DB first, API fallback, error if both fail."""
-    # 1. Try DB
-    item = None
-    try:
-        item = get_market_data(ticker)
-    except Exception as e:
-        logger.error("DB lookup failed", ticker=ticker, error_type="db_lookup", source="db", error=str(e))
+_RECORD_COLUMNS = ["date", "Open", "High", "Low", "Close", "Volume"]
+_RECORD_DTYPES = {"Open": "float64", "High": "float64", "Low": "float64", "Close": "float64", "Volume": "int64"}
+
+
+# {ticker: history} from the S3 market snapshot, shared by every record in the container
+_MARKET_CACHE = None
+_market_cache_loaded_at = 0.0
+_market_cache_lock = threading.Lock()
+
+
+def _load_market_cache():
+    """Load the market snapshot written by market_data.refresh_all, at most once per TTL per container."""
+    global _MARKET_CACHE, _market_cache_loaded_at
+
+    with _market_cache_lock:
+        if _MARKET_CACHE is not None and time.time() - _market_cache_loaded_at < MARKET_CACHE_TTL_SECONDS:
+            return _MARKET_CACHE
+
+        cache = {}
+        if MARKET_SNAPSHOT_BUCKET:
+            try:
+                t0 = time.time()
+                response = s3_client.get_object(Bucket=MARKET_SNAPSHOT_BUCKET, Key=MARKET_SNAPSHOT_KEY)
+                snapshot = pd.read_parquet(BytesIO(response["Body"].read()))
+                snapshot = snapshot.astype(_RECORD_DTYPES)
+                for ticker, group in snapshot.groupby("ticker", sort=False):
+                    cache[ticker] = group.drop(columns="ticker").set_index("date").sort_index()
+                logger.info("Loaded market snapshot", ticker_count=len(cache), source="snapshot", duration_ms=round((time.time() - t0) * 1000))
+            except Exception as e:
+                logger.error("Market snapshot load failed", error_type="snapshot_load", source="snapshot", error=str(e))
+
+        # A failed load is cached too, so a missing snapshot is retried once per TTL rather than per report
+        _MARKET_CACHE = cache
+        _market_cache_loaded_at = time.time()
+        return cache
 
+
+def _fetch_single_ticker(ticker, item):
+    """Parse a ticker's prefetched DB item. Returns its history, or None on a miss."""
     if item and item.get("is_valid") is False:
         raise InvalidTickerException(f"Ticker {ticker} is marked as invalid")
 
     if item and "records" in item:
         try:
-            df = pd.DataFrame(item["records"])
-            df["date"] = pd.to_datetime(df["date"])
-            df = df.set_index("date")
-            for col in ["Open", "High", "Low", "Close"]:
-                df[col] = df[col].astype(float)
-            df["Volume"] = df["Volume"].astype(int)
+            df = pd.DataFrame(item["records"], columns=_RECORD_COLUMNS)
+            # store_ticker_data writes dates as YYYY-MM-DD, so skip format inference
+            df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", cache=True)
+            df = df.astype(_RECORD_DTYPES)
+            df.set_index("date", inplace=True)
             if not df.empty:
-                return ticker, df, "db"
+                return df
         except Exception as e:
             logger.error("DB data parse failed", ticker=ticker, error_type="db_parse", source="db", error=str(e))
 
-    # 2. Fallback to API
+    return None
+
+
+# Upper bound on concurrent yfinance downloads per batched request. yfinance already
+# shares one curl_cffi session (and its keep-alive pool) across all of its threads.
+FETCH_MAX_WORKERS = 8
+
+# yf.download is not reentrant: every call resets the process-global yfinance.shared
+# result dicts and multitasking's thread limit, then waits for its own ticker count.
+# Records are processed concurrently, so their downloads must not overlap.
+_DOWNLOAD_LOCK = threading.Lock()
+
+
+def _download_tickers(tickers, period):
+    """Fetch history for several tickers with a single batched yfinance request."""
+    # Imported on first use: most lookups are served from the snapshot or DB, so
+    # containers that never miss skip yfinance's import cost at cold start
+    import yfinance as yf
+
     try:
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=period)
-        if hist is not None and not hist.empty:
-            store_ticker_data(ticker, hist, period)
-            return ticker, hist, "api"
+        # auto_adjust=True matches the Ticker.history() default the cache was built with
+        with _DOWNLOAD_LOCK:
+            bulk = yf.download(
+                " ".join(tickers), period=period, group_by='ticker',
+                threads=min(FETCH_MAX_WORKERS, len(tickers)), progress=False, auto_adjust=True,
+                # keep the (ticker, field) column levels even for a single-ticker request
+                multi_level_index=True,
+            )
     except Exception as e:
-        logger.error("API fetch failed", ticker=ticker, error_type="api_fetch", source="api", error=str(e))
-    
-    # 3. Both failed
-    # if both these mechanisms failed that means ticker actually does not exist in the market and therefore is actually invalid
-    # that means we can mark this ticker as invalid therefore other requests won't make redundant calls to the DB
+        logger.error("API fetch failed", tickers=tickers, error_type="api_fetch", source="api", error=str(e))
+        return {}
 
-    mark_ticker_as_invalid(ticker)
-    
-    raise TickerNotFoundException(f"Failed to fetch data for {ticker} from both DB and API")
+    if bulk is None or bulk.empty:
+        return {}
 
+    downloaded = {}
+    available = set(bulk.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        # A bad slice only drops this ticker into the "not found" branch, not the whole batch
+        try:
+            hist = bulk[ticker].dropna(how="all")
+        except Exception as e:
+            logger.error("API data parse failed", ticker=ticker, error_type="api_parse", source="api", error=str(e))
+            continue
+        if not hist.empty:
+            downloaded[ticker] = hist
+    return downloaded
 
-def fetch_data(tickers, period='2mo'):
-    data = {}
-    with ThreadPoolExecutor(max_workers=len(tickers)) as pool:
-        futures = {pool.submit(_fetch_single_ticker, t, period): t for t in tickers}
-        for future in futures:
-            ticker = futures[future]
-            try:
-                ticker, hist, source = future.result()
-                data[ticker] = hist
-                logger.info("Fetched ticker data", ticker=ticker, source=source)
-            except RuntimeError as e:
-                logger.error("Ticker fetch failed", ticker=ticker, error=str(e))
-                raise
-    return data
 
+# Cache writes only benefit later invocations, so they run off the critical path.
+# The pool is shared across warm invocations; lambda_handler waits for the
+# outstanding writes before returning, since a frozen container stalls them.
+_WRITE_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mdwrite")
+_pending_writes = []
+_pending_writes_lock = threading.Lock()
 
-def calculate_portfolio_metrics(portfolio, data, benchmark='SPY'):
-    results = []
-    total_value = 0
-    total_cost = 0
 
-    for ticker, shares in portfolio.items():
-        if ticker == benchmark or ticker not in data or data[ticker].empty:
-            continue
+def _drain_pending_writes():
+    with _pending_writes_lock:
+        futures = list(_pending_writes)
+        _pending_writes.clear()
+    if futures:
+        wait(futures)
 
-        current_price = data[ticker]['Close'].iloc[-1]
-        prev_close = data[ticker]['Close'].iloc[-2]
-        day_change = ((current_price - prev_close) / prev_close) * 100
 
-        position_value = current_price * shares
+def _store_downloaded(ticker, hist, period):
+    try:
+        store_ticker_data(ticker, hist, period)
+    except Exception as e:
+        logger.error("Cache write failed", ticker=ticker, error_type="db_write", source="db", error=str(e))
 
-        # Use 30-day ago price as cost basis
-        cost_basis_price = data[ticker]['Close'].iloc[-30] if len(data[ticker]) >= 30 else data[ticker]['Close'].iloc[0]
-        cost_basis = cost_basis_price * shares
 
-        results.append({
-            'ticker': ticker,
-            'shares': shares,
-            'current_price': current_price,
-            'day_change': day_change,
-            'position_value': position_value,
-            'cost_basis': cost_basis
-        })
+def fetch_data(tickers, period='2mo'):
+    """Fetch history for every ticker: S3 snapshot, then DB, then one batched API call for the misses, error if all fail."""
+    data = {}
 
-        total_value += position_value
-        total_cost += cost_basis
+    # 1. Try the market snapshot
+    snapshot = _load_market_cache()
+    remaining = []
+    for ticker in tickers:
+        hist = snapshot.get(ticker)
+        if hist is not None and not hist.empty:
+            data[ticker] = hist
+            logger.info("Fetched ticker data", ticker=ticker, source="snapshot")
+        else:
+            remaining.append(ticker)
 
-    return results, total_value, total_cost
+    if not remaining:
+        return data
 
+    # 2. Try DB — a single BatchGetItem for the tickers the snapshot lacks
+    items = {}
+    try:
+        items = get_market_data_batch(remaining)
+    except Exception as e:
+        logger.error("DB lookup failed", tickers=remaining, error_type="db_lookup", source="db", error=str(e))
 
-def calculate_portfolio_history(portfolio, data, days=30):
-    tickers = [t for t in portfolio.keys() if t != 'SPY']
+    missing = []
+    for ticker in remaining:
+        hist = _fetch_single_ticker(ticker, items.get(ticker))
+        if hist is None:
+            missing.append(ticker)
+        else:
+            data[ticker] = hist
+            logger.info("Fetched ticker data", ticker=ticker, source="db")
 
-    # Get common date range
-    min_length = min([len(data[t]) for t in tickers if t in data])
-    days = min(days, min_length)
+    if not missing:
+        return data
 
-    portfolio_values = []
+    # 3. Fallback to API for the misses only
+    downloaded = _download_tickers(missing, period)
+    for ticker, hist in downloaded.items():
+        data[ticker] = hist
+        logger.info("Fetched ticker data", ticker=ticker, source="api")
 
-    for i in range(-days, 0):
-        daily_value = 0
-        for ticker in tickers:
-            if ticker in data and len(data[ticker]) >= abs(i):
-                price = data[ticker]['Close'].iloc[i]
-                shares = portfolio[ticker]
-                daily_value += price * shares
-        portfolio_values.append(daily_value)
+    for ticker, hist in downloaded.items():
+        future = _WRITE_POOL.submit(_store_downloaded, ticker, hist, period)
+        with _pending_writes_lock:
+            _pending_writes.append(future)
 
-    return portfolio_values
+    # 4. All failed
+    # if these mechanisms failed that means ticker actually does not exist in the market and therefore is actually invalid
+    # that means we can mark this ticker as invalid therefore other requests won't make redundant calls to the DB
+    not_found = [t for t in missing if t not in downloaded]
+    for ticker in not_found:
+        mark_ticker_as_invalid(ticker)
 
+    if not_found:
+        raise TickerNotFoundException(f"Failed to fetch data for {', '.join(not_found)} from both DB and API")
 
-def calculate_advanced_metrics(portfolio_values, benchmark_data):
-    returns = pd.Series(portfolio_values).pct_change().dropna()
+    return data
 
-    # Sharpe Ratio (assuming 0% risk-free rate for simplicity)
-    sharpe = (returns.mean() / returns.std()) * np.sqrt(252) if returns.std() != 0 else 0
 
-    # Volatility (annualized)
-    volatility = returns.std() * np.sqrt(252) * 100
+def _portfolio_frame(portfolio, data, benchmark='SPY', log=None) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Align the close prices of every holding on their common dates, with the benchmark
+    (when available) as the last column. Returns the frame and the shares vector of the holdings,
+    so the first len(shares_vec) columns are the holdings in portfolio order.
+    Raises InsufficientMarketDataException when fewer than two common dates remain.
+    """
+    log = log or logger
+    tickers = [t for t in portfolio if t != benchmark and t in data and not data[t].empty]
+    columns = tickers + ([benchmark] if benchmark in data and not data[benchmark].empty else [])
+
+    closes = {}
+    for ticker in columns:
+        close = data[ticker]['Close']
+        # DB-cached and API-fetched histories must share one date index to align
+        if close.index.tz is not None:
+            close = close.tz_localize(None)
+        closes[ticker] = close.set_axis(close.index.normalize())
+
+    frame = pd.concat(closes, axis=1, join='inner').astype(np.float64)
+
+    # Day change needs the last two common dates; a stale series can leave fewer
+    if len(frame) < 2:
+        raise InsufficientMarketDataException(
+            f"Market data for {', '.join(columns)} shares {len(frame)} common date(s), need at least 2"
+        )
 
-    # Beta vs benchmark
-    if benchmark_data is not None and len(benchmark_data) > 0:
-        benchmark_returns = benchmark_data['Close'].iloc[-len(portfolio_values):].pct_change().dropna()
+    # A series that stops early drags every holding's "current" price back to its last date
+    latest = max(close.index[-1] for close in closes.values())
+    if frame.index[-1] < latest:
+        lagging = [t for t, close in closes.items() if close.index[-1] < latest]
+        log.warning("Market data is stale for some tickers, aligning on an older date",
+                    lagging_tickers=lagging, aligned_date=frame.index[-1].strftime('%Y-%m-%d'),
+                    latest_date=latest.strftime('%Y-%m-%d'))
 
-        min_len = min(len(returns), len(benchmark_returns))
-        returns_aligned = returns.iloc[-min_len:]
-        benchmark_aligned = benchmark_returns.iloc[-min_len:]
+    shares_vec = np.fromiter((portfolio[t] for t in tickers), dtype=np.float64, count=len(tickers))
+    return frame, shares_vec
 
-        if len(returns_aligned) > 1 and len(benchmark_aligned) > 1:
-            covariance = np.cov(returns_aligned, benchmark_aligned)[0][1]
-            benchmark_variance = np.var(benchmark_aligned)
-            beta = covariance / benchmark_variance if benchmark_variance != 0 else 1.0
-        else:
-            beta = 1.0
-    else:
-        beta = 1.0
 
-    # Max Drawdown
-    cumulative = (1 + returns).cumprod()
-    running_max = cumulative.expanding().max()
-    drawdown = (cumulative - running_max) / running_max
-    max_drawdown = drawdown.min() * 100
+# Struct-of-arrays view of the holdings: one NumPy array per field, aligned by position
+PortfolioView = namedtuple("PortfolioView", "tickers shares current_price day_change position_value cost_basis")
 
-    return {
-        'sharpe': sharpe,
-        'volatility': volatility,
-        'beta': beta,
-        'max_drawdown': max_drawdown
-    }
 
+def calculate_portfolio_metrics(frame, shares_vec):
+    tickers = frame.columns[:len(shares_vec)].to_numpy()
+    closes = frame.to_numpy()[:, :len(shares_vec)]
 
-def create_pie_chart(portfolio_data, width=3.5, height=3.5):
-    _, ax = plt.subplots(figsize=(width, height))
+    current_price = closes[-1]
+    prev_close = closes[-2]
+    day_change = (current_price - prev_close) / prev_close * 100.0
+    position_value = current_price * shares_vec
 
-    labels = [h['ticker'] for h in portfolio_data]
-    sizes = [h['position_value'] for h in portfolio_data]
-    chart_colors = plt.cm.Set3(range(len(labels)))
+    # Use 30-day ago price as cost basis
+    cost_basis_price = closes[-30] if len(closes) >= 30 else closes[0]
+    cost_basis = cost_basis_price * shares_vec
 
-    ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, colors=chart_colors)
-    ax.set_title('Allocation by Ticker', fontsize=10, fontweight='bold')
+    holdings = PortfolioView(tickers, shares_vec, current_price, day_change, position_value, cost_basis)
+    return holdings, position_value.sum(), cost_basis.sum()
 
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-    buf.seek(0)
-    plt.close()
 
-    return buf
+def calculate_portfolio_history(frame, shares_vec, days=30):
+    # (days, N) close prices weighted by shares in one GEMV instead of a days x N Python loop
+    price_mat = frame.to_numpy()[-days:, :len(shares_vec)]
+    return (price_mat @ shares_vec).tolist()
 
 
-def create_line_chart(portfolio_history, width=6, height=3):
-    _, ax = plt.subplots(figsize=(width, height))
+def calculate_advanced_metrics(portfolio_values, benchmark_closes):
+    values = np.asarray(portfolio_values, dtype=np.float64)
+    returns = np.diff(values) / values[:-1]
+    returns_std = returns.std(ddof=1) if returns.size > 1 else np.nan
 
-    dates = pd.date_range(end=datetime.now(), periods=len(portfolio_history), freq='D')
-    ax.plot(dates, portfolio_history, linewidth=2, color='#4472C4')
-    ax.fill_between(dates, portfolio_history, alpha=0.3, color='#4472C4')
-    ax.set_title('30-Day Portfolio Value Trend', fontsize=10, fontweight='bold')
-    ax.set_xlabel('Date', fontsize=8)
-    ax.set_ylabel('Value ($)', fontsize=8)
-    ax.grid(True, alpha=0.3)
-    ax.tick_params(axis='both', labelsize=7)
-    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+    # Sharpe Ratio (assuming 0% risk-free rate for simplicity)
+    sharpe = (returns.mean() / returns_std) * np.sqrt(252) if returns_std != 0 else 0
+
+    # Volatility (annualized)
+    volatility = returns_std * np.sqrt(252) * 100
 
-    buf = BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-    buf.seek(0)
-    plt.close()
+    # Beta vs benchmark
+    # benchmark_closes comes from the same aligned frame, so the tails share dates
+    beta = 1.0
+    if benchmark_closes is not None and len(benchmark_closes) > 0:
+        closes = np.asarray(benchmark_closes[-len(values):], dtype=np.float64)
+        benchmark_returns = np.diff(closes) / closes[:-1]
+
+        min_len = min(returns.size, benchmark_returns.size)
+        if min_len > 1:
+            r = returns[-min_len:]
+            b = benchmark_returns[-min_len:]
+            # Centered dot products: cov(r, b) / var(b) without the 2x2 np.cov matrix
+            b_centered = b - b.mean()
+            benchmark_ss = b_centered @ b_centered
+            if benchmark_ss != 0:
+                beta = ((r - r.mean()) @ b_centered) / benchmark_ss
+
+    # Max Drawdown
+    cumulative = np.cumprod(1 + returns)
+    running_max = np.maximum.accumulate(cumulative)
+    max_drawdown = ((cumulative - running_max) / running_max).min() * 100 if cumulative.size else np.nan
 
-    return buf
+    return {
+        'sharpe': sharpe,
+        'volatility': volatility,
+        'beta': beta,
+        'max_drawdown': max_drawdown
+    }
 
 
-def create_pdf_dashboard(portfolio_data, total_value, total_cost, portfolio_history, metrics):
+# matplotlib's Set3 palette, cycled when a portfolio has more holdings than colours
+_PIE_COLORS = [colors.HexColor(c) for c in (
+    '#8dd3c7', '#ffffb3', '#bebada', '#fb8072', '#80b1d3', '#fdb462',
+    '#b3de69', '#fccde5', '#d9d9d9', '#bc80bd', '#ccebc5', '#ffed6f',
+)]
+_LINE_COLOR = colors.HexColor('#4472C4')
+
+
+def create_pie_chart(holdings, width=3*inch, height=3*inch):
+    # Vector chart drawn straight into the PDF: a handful of wedges is not worth a raster pipeline
+    sizes = holdings.position_value.tolist()
+    total = sum(sizes)
+    labels = [f"{t} {v / total * 100:.1f}%" if total else t for t, v in zip(holdings.tickers.tolist(), sizes)]
+
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 12, 'Allocation by Ticker',
+                       fontName='Helvetica-Bold', fontSize=10, textAnchor='middle'))
+
+    pie = Pie()
+    size = min(width, height - 24) - 50
+    pie.x = (width - size) / 2
+    pie.y = (height - 24 - size) / 2
+    pie.width = pie.height = size
+    pie.data = sizes
+    pie.labels = labels
+    pie.startAngle = 90
+    pie.direction = 'anticlockwise'
+    pie.simpleLabels = 1
+    pie.slices.fontSize = 7
+    pie.slices.strokeColor = colors.white
+    for i in range(len(sizes)):
+        pie.slices[i].fillColor = _PIE_COLORS[i % len(_PIE_COLORS)]
+
+    drawing.add(pie)
+    return drawing
+
+
+def create_line_chart(portfolio_history, width=4*inch, height=2*inch):
+    dates = pd.date_range(end=datetime.now(), periods=len(portfolio_history), freq='D')
+    date_labels = dates.strftime('%m-%d').tolist()
+
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 12, '30-Day Portfolio Value Trend',
+                       fontName='Helvetica-Bold', fontSize=10, textAnchor='middle'))
+
+    plot = LinePlot()
+    plot.x = 45
+    plot.y = 30
+    plot.width = width - plot.x - 10
+    plot.height = height - plot.y - 22
+    plot.data = [list(enumerate(portfolio_history))]
+    plot.lines[0].strokeColor = _LINE_COLOR
+    plot.lines[0].strokeWidth = 2
+    plot.lines[0].inFill = True
+    plot.lines[0].fillColor = colors.Color(_LINE_COLOR.red, _LINE_COLOR.green, _LINE_COLOR.blue, alpha=0.3)
+
+    plot.xValueAxis.valueMin = 0
+    plot.xValueAxis.valueMax = max(len(portfolio_history) - 1, 1)
+    plot.xValueAxis.valueStep = max(len(portfolio_history) // 6, 1)
+    plot.xValueAxis.labelTextFormat = lambda i: date_labels[int(i)] if 0 <= int(i) < len(date_labels) else ''
+    plot.xValueAxis.labels.fontSize = 7
+    plot.xValueAxis.labels.angle = 45
+    plot.xValueAxis.labels.boxAnchor = 'ne'
+
+    plot.yValueAxis.labelTextFormat = '$%.0f'
+    plot.yValueAxis.labels.fontSize = 7
+    plot.yValueAxis.visibleGrid = True
+    plot.yValueAxis.gridStrokeColor = colors.Color(0, 0, 0, alpha=0.15)
+
+    drawing.add(plot)
+    return drawing
+
+
+# Styles are invariant across reports, so they are built once per container
+_STYLES = getSampleStyleSheet()
+
+_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#1f4788'),
+    spaceAfter=6,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Bold'
+)
+
+_SUBTITLE_STYLE = ParagraphStyle(
+    'CustomSubtitle',
+    parent=_STYLES['Normal'],
+    fontSize=10,
+    textColor=colors.grey,
+    spaceAfter=20,
+    alignment=TA_CENTER
+)
+
+_SECTION_STYLE = ParagraphStyle(
+    'SectionHeader',
+    parent=_STYLES['Heading2'],
+    fontSize=12,
+    textColor=colors.HexColor('#1f4788'),
+    spaceAfter=8,
+    fontName='Helvetica-Bold'
+)
+
+_SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f0f0')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#e8f4f8'), colors.white]),
+])
+
+# Kept as a list: the per-row day-change colouring is appended to a copy
+_HOLDINGS_BASE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
+]
+
+_CHART_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+])
+
+_METRICS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#e8f4f8')),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTSIZE', (0, 1), (-1, 1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 1), (-1, 1), 12),
+    ('BOTTOMPADDING', (0, 1), (-1, 1), 12),
+])
+
+
+def create_pdf_dashboard(holdings, total_value, total_cost, portfolio_history, metrics):
     buffer = BytesIO()
+    # pageCompression pinned on rather than inherited from the global rl_config default
     doc = SimpleDocTemplate(buffer, pagesize=letter,
                            rightMargin=0.5*inch, leftMargin=0.5*inch,
-                           topMargin=0.5*inch, bottomMargin=0.5*inch)
+                           topMargin=0.5*inch, bottomMargin=0.5*inch,
+                           pageCompression=1)
 
     elements = []
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1f4788'),
-        spaceAfter=6,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.grey,
-        spaceAfter=20,
-        alignment=TA_CENTER
-    )
-
-    section_style = ParagraphStyle(
-        'SectionHeader',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#1f4788'),
-        spaceAfter=8,
-        fontName='Helvetica-Bold'
-    )
 
     # Title
-    title = Paragraph("Portfolio Dashboard", title_style)
+    title = Paragraph("Portfolio Dashboard", _TITLE_STYLE)
     elements.append(title)
 
     date_str = datetime.now().strftime('%B %d, %Y')
-    subtitle = Paragraph(date_str, subtitle_style)
+    subtitle = Paragraph(date_str, _SUBTITLE_STYLE)
     elements.append(subtitle)
 
     # Portfolio Summary Box
-    daily_pnl = total_value - sum([h['position_value'] / (1 + h['day_change']/100) for h in portfolio_data])
+    # Yesterday's position values, recovered from today's values and day changes in one ufunc pass
+    daily_pnl = total_value - (holdings.position_value / (1 + holdings.day_change / 100)).sum()
     overall_return = ((total_value - total_cost) / total_cost) * 100 if total_cost > 0 else 0
 
     summary_data = [
@@ -296,57 +578,38 @@ def create_pdf_dashboard(portfolio_data, total_value, total_cost, portfolio_hist
     ]
 
     summary_table = Table(summary_data, colWidths=[2.5*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f0f0')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.HexColor('#e8f4f8'), colors.white]),
-    ]))
+    summary_table.setStyle(_SUMMARY_TABLE_STYLE)
 
     elements.append(summary_table)
     elements.append(Spacer(1, 0.2*inch))
 
     # Holdings Table
-    holdings_header = Paragraph("Current Holdings", section_style)
+    holdings_header = Paragraph("Current Holdings", _SECTION_STYLE)
     elements.append(holdings_header)
 
     table_data = [['Ticker', 'Shares', 'Price', 'Day Change', 'Position Value']]
 
-    for holding in portfolio_data:
+    for ticker, shares, price, change, value in zip(
+        holdings.tickers, holdings.shares, holdings.current_price, holdings.day_change, holdings.position_value,
+    ):
         table_data.append([
-            holding['ticker'],
-            f"{holding['shares']:.0f}",
-            f"${holding['current_price']:.2f}",
-            f"{holding['day_change']:+.2f}%",
-            f"${holding['position_value']:,.2f}"
+            ticker,
+            f"{shares:.0f}",
+            f"${price:.2f}",
+            f"{change:+.2f}%",
+            f"${value:,.2f}"
         ])
 
     holdings_table = Table(table_data, colWidths=[1*inch, 1*inch, 1.2*inch, 1.3*inch, 1.5*inch])
 
-    table_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
-    ]
+    table_style = _HOLDINGS_BASE_STYLE.copy()
 
     # Color code day changes
-    for i, holding in enumerate(portfolio_data, start=1):
-        if holding['day_change'] > 0:
+    for i, change in enumerate(holdings.day_change, start=1):
+        if change > 0:
             table_style.append(('BACKGROUND', (3, i), (3, i), colors.HexColor('#d4edda')))
             table_style.append(('TEXTCOLOR', (3, i), (3, i), colors.HexColor('#155724')))
-        elif holding['day_change'] < 0:
+        elif change < 0:
             table_style.append(('BACKGROUND', (3, i), (3, i), colors.HexColor('#f8d7da')))
             table_style.append(('TEXTCOLOR', (3, i), (3, i), colors.HexColor('#721c24')))
 
@@ -354,28 +617,19 @@ def create_pdf_dashboard(portfolio_data, total_value, total_cost, portfolio_hist
     elements.append(holdings_table)
     elements.append(Spacer(1, 0.3*inch))
 
-    # Charts side by side (generated in parallel)
-    with ThreadPoolExecutor(max_workers=2) as pool:
-        pie_future = pool.submit(create_pie_chart, portfolio_data)
-        line_future = pool.submit(create_line_chart, portfolio_history)
-        pie_buf = pie_future.result()
-        line_buf = line_future.result()
+    # Charts side by side, as vector drawings
+    pie_chart = create_pie_chart(holdings)
+    line_chart = create_line_chart(portfolio_history)
 
-    pie_img = Image(pie_buf, width=3*inch, height=3*inch)
-    line_img = Image(line_buf, width=4*inch, height=2*inch)
-
-    chart_data = [[pie_img, line_img]]
+    chart_data = [[pie_chart, line_chart]]
     chart_table = Table(chart_data, colWidths=[3.2*inch, 4.2*inch])
-    chart_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-    ]))
+    chart_table.setStyle(_CHART_TABLE_STYLE)
 
     elements.append(chart_table)
     elements.append(Spacer(1, 0.2*inch))
 
     # Metrics boxes
-    metrics_header = Paragraph("Key Metrics", section_style)
+    metrics_header = Paragraph("Key Metrics", _SECTION_STYLE)
     elements.append(metrics_header)
 
     metrics_data = [
@@ -385,31 +639,19 @@ def create_pdf_dashboard(portfolio_data, total_value, total_cost, portfolio_hist
             f"{metrics['volatility']:.2f}%",
             f"{metrics['beta']:.2f}",
             f"{metrics['max_drawdown']:.2f}%",
-            f"{len(portfolio_data)}"
+            f"{len(holdings.tickers)}"
         ]
     ]
 
     metrics_table = Table(metrics_data, colWidths=[1.4*inch]*5)
-    metrics_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#e8f4f8')),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('FONTSIZE', (0, 1), (-1, 1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 1), (-1, 1), 12),
-        ('BOTTOMPADDING', (0, 1), (-1, 1), 12),
-    ]))
+    metrics_table.setStyle(_METRICS_TABLE_STYLE)
 
     elements.append(metrics_table)
 
     # Build PDF
     doc.build(elements)
-    return buffer.getvalue()
+    buffer.seek(0)
+    return buffer
 
 
 def collect_data_and_generate_report(portfolio, log=None):
@@ -421,94 +663,179 @@ def collect_data_and_generate_report(portfolio, log=None):
     data = fetch_data(all_tickers)
     log.info("Market data fetched", duration_ms=round((time.time() - t0) * 1000))
 
+    frame, shares_vec = _portfolio_frame(portfolio, data, log=log)
+
     log.info("Calculating portfolio metrics")
-    portfolio_data, total_value, total_cost = calculate_portfolio_metrics(portfolio, data)
+    holdings, total_value, total_cost = calculate_portfolio_metrics(frame, shares_vec)
 
     log.info("Calculating portfolio history")
-    portfolio_history = calculate_portfolio_history(portfolio, data, days=30)
+    portfolio_history = calculate_portfolio_history(frame, shares_vec, days=30)
 
     log.info("Calculating advanced metrics")
-    benchmark_data = data.get('SPY', None)
-    metrics = calculate_advanced_metrics(portfolio_history, benchmark_data)
+    benchmark_closes = frame['SPY'].to_numpy() if 'SPY' in frame.columns else None
+    metrics = calculate_advanced_metrics(portfolio_history, benchmark_closes)
 
     log.info("Generating PDF", total_value=round(total_value, 2))
     t0 = time.time()
-    pdf_content = create_pdf_dashboard(portfolio_data, total_value, total_cost, portfolio_history, metrics)
+    pdf_buffer = create_pdf_dashboard(holdings, total_value, total_cost, portfolio_history, metrics)
     log.info("PDF generated", duration_ms=round((time.time() - t0) * 1000))
 
-    return pdf_content
+    return pdf_buffer
 
 
-def lambda_handler(event, context):
-    processed_count = 0
-    reports = []
+def flush_status_updates(pending, log=None):
+    """Write the accumulated terminal status updates in batched DynamoDB requests."""
+    log = log or logger
+    if not pending:
+        return
+    t0 = time.time()
+    batch_update_report_status(pending)
+    log.info("Flushed status updates", count=len(pending), duration_ms=round((time.time() - t0) * 1000))
+    pending.clear()
 
-    total_records = len(event["Records"])
-    logger.info("Received SQS records", total_records=total_records)
 
-    for idx, record in enumerate[Any](event["Records"]):
-        body = json.loads(record["body"])
-        report = Report(
-            report_id=body["report_id"],
-            batch_no=body["batch_no"],
-            payload=body["payload"],
-            status=Status.QUEUED,
+# Uploads run on their own pool so a record worker is free as soon as its PDF is built
+_UPLOAD_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="upload")
+
+
+def _upload_report(report, pdf_buffer, s3_key, log):
+    """Upload a rendered report to S3 and mark it FINISHED. Errors propagate to the upload future."""
+    try:
+        t0 = time.time()
+        s3_client.upload_fileobj(
+            pdf_buffer,
+            S3_BUCKET_NAME,
+            s3_key,
+            ExtraArgs={"ContentType": "application/pdf"},
+            Config=_TRANSFER_CONFIG,
         )
+        log.info("S3 upload complete", duration_ms=round((time.time() - t0) * 1000))
+    except Exception as e:
+        log.error("Unhandled error, retrying", error=str(e))
+        raise
+
+    report.s3_key = s3_key
+    report.status = Status.FINISHED
+    log.info("Status transition", status="FINISHED")
+    return report
+
+
+def _process_record(record, idx, total_records):
+    """
+    Claim and render the report carried by a single SQS record, then hand the upload to _UPLOAD_POOL.
+    Returns (report, upload_future): report is None when another execution already claimed it,
+    and upload_future is None when nothing is being uploaded (the report was rejected).
+    Unexpected errors propagate so the record is reported as a batch item failure.
+    """
+    report = Report.from_message(record["body"])
+    report.status = Status.QUEUED
+
+    log = logger.bind(batch_no=report.batch_no, report_id=report.report_id, index=idx + 1, total=total_records)
+
+    # Atomically claim the report — prevents duplicate SQS deliveries from
+    # processing the same report twice (at-least-once delivery guarantee).
+    # The claim is also the only IN_PROGRESS write for this record.
+    if not claim_report_for_processing(report.report_id, report.batch_no):
+        log.info("Already claimed by another execution, skipping")
+        return None, None
+
+    try:
+        report.status = Status.IN_PROGRESS
+        log.info("Status transition", status="IN_PROGRESS")
 
-        log = logger.bind(batch_no=report.batch_no, report_id=report.report_id, index=idx + 1, total=total_records)
+        pdf_buffer = collect_data_and_generate_report(report.payload, log=log)
 
-        # Atomically claim the report — prevents duplicate SQS deliveries from
-        # processing the same report twice (at-least-once delivery guarantee)
-        if not claim_report_for_processing(report.report_id, report.batch_no):
-            log.info("Already claimed by another execution, skipping")
-            continue
+        report.status = Status.UPLOAD_STARTED
+        s3_key = f"reports/batch-{report.batch_no}/{report.report_id}/portfolio_dashboard_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
+        log.info("Status transition", status="UPLOAD_STARTED", s3_bucket=S3_BUCKET_NAME, s3_key=s3_key)
 
+        return report, _UPLOAD_POOL.submit(_upload_report, report, pdf_buffer, s3_key, log)
+
+    except (TickerNotFoundException, InvalidTickerException, InsufficientMarketDataException) as e:
+        report.status = Status.REJECTED
+        report.error_msg = str(e)
+        update_report_status(report.report_id, report.batch_no, Status.REJECTED, error_msg = report.error_msg)
+        log.warning("Status transition", status="REJECTED", error=str(e))
         try:
-            report.status = Status.IN_PROGRESS
-            log.info("Status transition", status="IN_PROGRESS")
-
-            pdf_content = collect_data_and_generate_report(report.payload, log=log)
-
-            report.status = Status.UPLOAD_STARTED
-            update_report_status(report.report_id, report.batch_no, Status.UPLOAD_STARTED)
-            s3_key = f"reports/batch-{report.batch_no}/{report.report_id}/portfolio_dashboard_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-            log.info("Status transition", status="UPLOAD_STARTED", s3_bucket=S3_BUCKET_NAME, s3_key=s3_key)
-
-            t0 = time.time()
-            s3_client.put_object(
-                Bucket=S3_BUCKET_NAME,
-                Key=s3_key,
-                Body=pdf_content,
-                ContentType="application/pdf",
+            log.info("Sending to DLQ")
+            sqs_client.send_message(
+                QueueUrl = DLQ_QUEUE_URL,
+                MessageBody = _json_dumps(record),
             )
-            log.info("S3 upload complete", duration_ms=round((time.time() - t0) * 1000))
+        except Exception as e:
+            log.error("Failed to send to DLQ", error=str(e))
+    except Exception as e:
+        log.error("Unhandled error, retrying", error=str(e))
+        raise
 
-            report.s3_key = s3_key
-            report.status = Status.FINISHED
-            update_report_status(report.report_id, report.batch_no, Status.FINISHED, s3_key = s3_key)
-            log.info("Status transition", status="FINISHED")
-            processed_count += 1
+    return report, None
 
-        except (TickerNotFoundException, InvalidTickerException) as e:
-            report.status = Status.REJECTED
-            report.error_msg = str(e)
-            update_report_status(report.report_id, report.batch_no, Status.REJECTED, error_msg = report.error_msg)
-            log.warning("Status transition", status="REJECTED", error=str(e))
-            try:
-                log.info("Sending to DLQ")
-                sqs_client.send_message(
-                    QueueUrl = DLQ_QUEUE_URL,
-                    MessageBody = json.dumps(record),
-                )
-            except Exception as e:
-                log.error("Failed to send to DLQ", error=str(e))
-        except Exception as e:
-            log.error("Unhandled error, retrying", error=str(e))
-            raise
 
-        reports.append(report.model_dump(mode="json"))
+def lambda_handler(event, context):
+    processed_count = 0
+    reports = []
+    batch_item_failures = []
+    # FINISHED updates are deferred and written together once the batch is done.
+    # REJECTED stays synchronous: the DLQ handler overwrites it with FAILED, so it
+    # must land before the message is forwarded.
+    pending_updates = []
+    uploads = {}
 
-    return {"processed_messages": processed_count, "reports": reports}
+    total_records = len(event["Records"])
+    logger.info("Received SQS records", total_records=total_records)
 
+    try:
+        # Records spend most of their time waiting on the network, so they are
+        # processed concurrently; boto3 clients are safe to share across threads.
+        with ThreadPoolExecutor(max_workers=max(1, min(10, total_records))) as pool:
+            futures = {
+                pool.submit(_process_record, record, idx, total_records): record
+                for idx, record in enumerate[Any](event["Records"])
+            }
+            for future in as_completed(futures):
+                record = futures[future]
+                try:
+                    report, upload = future.result()
+                except Exception:
+                    batch_item_failures.append({"itemIdentifier": record["messageId"]})
+                    continue
+
+                if report is None:
+                    continue
+
+                if upload is not None:
+                    uploads[upload] = record
+                else:
+                    reports.append(report.to_json_dict())
+
+        # A report only counts as FINISHED once its PDF is in S3
+        for upload in as_completed(uploads):
+            record = uploads[upload]
+            try:
+                report = upload.result()
+            except Exception:
+                batch_item_failures.append({"itemIdentifier": record["messageId"]})
+                continue
+
+            pending_updates.append({
+                "report_id": report.report_id,
+                "batch_no": report.batch_no,
+                "status": Status.FINISHED,
+                "s3_key": report.s3_key,
+            })
+            processed_count += 1
+            reports.append(report.to_json_dict())
+    finally:
+        # Runs even if the pool is torn down early, so reports that already
+        # reached S3 are not left IN_PROGRESS
+        try:
+            flush_status_updates(pending_updates)
+        finally:
+            # Cache writes are awaited even when the status flush raises
+            _drain_pending_writes()
 
+    if batch_item_failures:
+        logger.warning("Some records failed and will be retried", failed_count=len(batch_item_failures), total_records=total_records)
 
+    # batchItemFailures requires ReportBatchItemFailures on the SQS event source mapping
+    return {"processed_messages": processed_count, "reports": reports, "batchItemFailures": batch_item_failures}
@@ -3,6 +3,7 @@ import boto3
 from datetime import datetime
 from typing import Optional
 from boto3.dynamodb.conditions import Key
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 from models import Report, Status
@@ -16,26 +17,55 @@ except ImportError:
 AWS_REGION = os.environ.get("AWS_REGION", "ap-south-2")
 TABLE_NAME = os.environ.get("TABLE_NAME", "reports")
 
-_boto_kwargs = {"region_name": AWS_REGION}
+# Keep-alive + a larger pool lets warm Lambda invocations reuse the TLS
+# connection instead of paying a fresh handshake per DynamoDB call.
+_boto_config = Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={"mode": "adaptive", "max_attempts": 5},
+    connect_timeout=1,
+    read_timeout=3,
+)
+
+_boto_kwargs = {"region_name": AWS_REGION, "config": _boto_config}
 
 dynamodb = boto3.resource("dynamodb", **_boto_kwargs)
 table = dynamodb.Table(TABLE_NAME)
 
+# TransactWriteItems accepts at most 100 actions per request
+TRANSACT_MAX_ITEMS = 100
 
-def create_report(report: Report) -> tuple[dict, bool]:
-    """
-    Creates a report only if it does not already exist.
-    Returns (item, created) — created=False means a duplicate was detected and nothing was written.
-    """
-    item = {
+# Invariant pieces of the status update, keyed by (has_s3_key, has_error_msg)
+_STATUS_EXPR_NAMES = {"#status": "status"}
+_BASE_UPDATE_EXPR = "SET #status = :status, updated_at = :updated_at"
+_STATUS_UPDATE_EXPRS = {
+    (False, False): _BASE_UPDATE_EXPR,
+    (True, False): _BASE_UPDATE_EXPR + ", s3_key = :s3_key",
+    (False, True): _BASE_UPDATE_EXPR + ", error_msg = :error_msg",
+    (True, True): _BASE_UPDATE_EXPR + ", s3_key = :s3_key, error_msg = :error_msg",
+}
+
+_BATCH_KCE_FACTORY = Key("batch_no").eq
+
+
+def _report_item(report: Report, now: str) -> dict:
+    return {
         "report_id": report.report_id,
         "batch_no": report.batch_no,
-        "status": report.status.value,
+        "status": report.status,
         "s3_key": report.s3_key,
         "payload": report.payload,
-        "created_at": datetime.now().isoformat(),
-        "updated_at": datetime.now().isoformat(),
+        "created_at": now,
+        "updated_at": now,
     }
+
+
+def create_report(report: Report) -> tuple[dict, bool]:
+    """
+    Creates a report only if it does not already exist.
+    Returns (item, created) — created=False means a duplicate was detected and nothing was written.
+    """
+    item = _report_item(report, datetime.now().isoformat())
     try:
         table.put_item(
             Item=item,
@@ -48,6 +78,19 @@ def create_report(report: Report) -> tuple[dict, bool]:
         raise
 
 
+def create_reports_bulk(reports: list[Report]) -> list[dict]:
+    """
+    Creates many reports through batch_writer (25-item BatchWriteItem calls).
+    Writes are unconditional, so only use this for a fresh batch_no — retries go through create_report.
+    """
+    now = datetime.now().isoformat()
+    items = [_report_item(report, now) for report in reports]
+    with table.batch_writer() as writer:
+        for item in items:
+            writer.put_item(Item=item)
+    return items
+
+
 def claim_report_for_processing(report_id: int, batch_no: int) -> bool:
     """
     Atomically transitions a report from QUEUED to IN_PROGRESS.
@@ -59,10 +102,10 @@ def claim_report_for_processing(report_id: int, batch_no: int) -> bool:
             Key={"report_id": report_id, "batch_no": batch_no},
             UpdateExpression="SET #status = :in_progress, updated_at = :ts",
             ConditionExpression="#status = :queued",
-            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeNames=_STATUS_EXPR_NAMES,
             ExpressionAttributeValues={
-                ":in_progress": Status.IN_PROGRESS.value,
-                ":queued": Status.QUEUED.value,
+                ":in_progress": Status.IN_PROGRESS,
+                ":queued": Status.QUEUED,
                 ":ts": datetime.now().isoformat(),
             },
         )
@@ -82,27 +125,30 @@ def get_report(report_id: int, batch_no: int) -> Optional[dict]:
 def get_reports_by_batch(batch_no: int) -> list[dict]:
     response = table.query(
         IndexName="batch_no-index",
-        KeyConditionExpression=Key("batch_no").eq(batch_no),
+        KeyConditionExpression=_BATCH_KCE_FACTORY(batch_no),
     )
     return response.get("Items", [])
 
 
-def update_report_status(report_id: int, batch_no: int, status: Status, s3_key: Optional[str] = None, error_msg:Optional[str] = None) -> dict:
-    update_expr = "SET #status = :status, updated_at = :updated_at"
+def _build_status_update(status: Status, updated_at: str, s3_key: Optional[str] = None, error_msg: Optional[str] = None) -> tuple[str, dict, dict]:
     expr_values = {
-        ":status": status.value,
-        ":updated_at": datetime.now().isoformat(),
+        ":status": status,
+        ":updated_at": updated_at,
     }
-    expr_names = {"#status": "status"}
 
     if s3_key is not None:
-        update_expr += ", s3_key = :s3_key"
         expr_values[":s3_key"] = s3_key
     
     if error_msg is not None:
-        update_expr += ", error_msg = :error_msg"
         expr_values[":error_msg"] = error_msg
 
+    update_expr = _STATUS_UPDATE_EXPRS[(s3_key is not None, error_msg is not None)]
+    return update_expr, _STATUS_EXPR_NAMES, expr_values
+
+
+def update_report_status(report_id: int, batch_no: int, status: Status, s3_key: Optional[str] = None, error_msg:Optional[str] = None) -> dict:
+    update_expr, expr_names, expr_values = _build_status_update(status, datetime.now().isoformat(), s3_key, error_msg)
+
     response = table.update_item(
         Key={"report_id": report_id, "batch_no": batch_no},
         UpdateExpression=update_expr,
@@ -113,6 +159,34 @@ def update_report_status(report_id: int, batch_no: int, status: Status, s3_key:
     return response["Attributes"]
 
 
+def batch_update_report_status(updates: list[dict]) -> None:
+    """
+    Applies many status updates in as few round trips as possible via TransactWriteItems.
+    Each entry holds report_id, batch_no, status and optionally s3_key / error_msg.
+    Updates (not puts) are used so the rest of each item — payload, created_at — is preserved.
+    """
+    # One timestamp for the whole batch — the updates are flushed together
+    now = datetime.now().isoformat()
+    actions = []
+    for update in updates:
+        update_expr, expr_names, expr_values = _build_status_update(
+            update["status"], now, update.get("s3_key"), update.get("error_msg"),
+        )
+        actions.append({
+            "Update": {
+                "TableName": TABLE_NAME,
+                "Key": {"report_id": update["report_id"], "batch_no": update["batch_no"]},
+                "UpdateExpression": update_expr,
+                "ExpressionAttributeNames": expr_names,
+                "ExpressionAttributeValues": expr_values,
+            }
+        })
+
+    # The resource's client serializes plain Python values itself
+    for start in range(0, len(actions), TRANSACT_MAX_ITEMS):
+        dynamodb.meta.client.transact_write_items(TransactItems=actions[start:start + TRANSACT_MAX_ITEMS])
+
+
 
 def delete_report(report_id: int, batch_no: int) -> bool:
     table.delete_item(Key={"report_id": report_id, "batch_no": batch_no})
@@ -1,19 +1,50 @@
 """
 Checks that every Python file in the project (excluding venv/) is free of
-linting errors (via ruff) and syntax errors (via ast.parse).
+linting errors and syntax errors, both reported by a single ruff run.
+Files ruff found clean are remembered in the pytest cache and only re-checked
+once they change.
 """
-import ast
+import functools
+import hashlib
+import heapq
+import json
+import os
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import pytest
+
 ROOT = Path(__file__).resolve().parent.parent
 
+# Ruff reports unparsable files under its own code rather than a lint rule
+# (`invalid-syntax` today, `E999` or no code in older releases)
+SYNTAX_ERROR_CODES = {"invalid-syntax", "E999", None}
+
 EXCLUDED_DIRS = {"venv", "__pycache__", ".ruff_cache", ".mypy_cache", ".pytest_cache"}
 
+# Every extension `ruff check .` picks up by default
+RUFF_EXTENSIONS = (".py", ".pyi", ".ipynb")
+
+# Ruff's verdict also depends on its own build and configuration
+RUFF_CONFIG_FILES = ["pyproject.toml", "ruff.toml", ".ruff.toml"]
+
+CLEAN_FILES_CACHE_KEY = "code_quality/clean_files"
+TREE_FINGERPRINT_CACHE_KEY = "code_quality/tree_fingerprint"
+RUFF_PATH_CACHE_KEY = "code_quality/ruff_path"
+
+# Below this many files a thread pool costs more than it saves
+PARALLEL_HASH_MIN_FILES = 64
 
-def _ruff_executable() -> str:
+# One ruff process amortises best; only trees past this size are split into concurrent runs
+RUFF_BATCH_MIN_FILES = 2000
+RUFF_FILES_PER_BATCH = 1000
+
+
+@functools.cache
+def _find_ruff() -> str:
     # Prefer ruff on PATH (works when venv is activated), then fall back to the
     # project venv, then the venv next to sys.executable.
     if found := shutil.which("ruff"):
@@ -29,31 +60,163 @@ def _ruff_executable() -> str:
     )
 
 
-def _project_python_files() -> list[Path]:
-    return [
-        p for p in ROOT.rglob("*.py")
-        if not any(part in EXCLUDED_DIRS for part in p.parts)
-    ]
+def _ruff_executable(cache=None) -> str:
+    # A path found by an earlier session costs one access() check instead of a PATH scan;
+    # run pytest with --cache-clear to pick up a different ruff.
+    if cache is not None:
+        cached = cache.get(RUFF_PATH_CACHE_KEY, None)
+        if cached and os.access(cached, os.X_OK):
+            return cached
+
+    found = _find_ruff()
+    if cache is not None:
+        cache.set(RUFF_PATH_CACHE_KEY, found)
+    return found
+
+
+def _walk_python_files(directory: str):
+    # Prune excluded directories before descending instead of filtering their files afterwards
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in EXCLUDED_DIRS:
+                    yield from _walk_python_files(entry.path)
+            elif entry.name.endswith(RUFF_EXTENSIONS):
+                yield Path(entry.path)
+
+
+# The tree does not change during a session, so the walk is shared by every caller
+@functools.cache
+def _project_python_files() -> tuple[Path, ...]:
+    return tuple(_walk_python_files(str(ROOT)))
+
+
+def _read_bytes(path: Path) -> bytes:
+    # Raw open/fstat/read/close, without the buffered file object read_bytes() builds
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
+
+
+def _content_key(path: Path) -> str:
+    # Keyed on content, not mtime: fresh CI checkouts reset every timestamp
+    return hashlib.blake2b(_read_bytes(path), digest_size=16).hexdigest()
+
+
+def _content_keys(files: tuple[Path, ...]) -> dict[str, str]:
+    # os.read and blake2b both release the GIL, so reads and hashes overlap across threads
+    if len(files) < PARALLEL_HASH_MIN_FILES:
+        keys = map(_content_key, files)
+    else:
+        with ThreadPoolExecutor() as pool:
+            keys = list(pool.map(_content_key, files))
+    return {str(p.relative_to(ROOT)): key for p, key in zip(files, keys)}
+
 
+def _ruff_fingerprint(ruff: str) -> dict:
+    config_files = (ROOT / name for name in RUFF_CONFIG_FILES)
+    st = Path(ruff).stat()
+    return {
+        "ruff": [ruff, st.st_mtime_ns, st.st_size],
+        "config": {p.name: _content_key(p) for p in config_files if p.exists()},
+    }
 
-def test_ruff_no_linting_errors():
-    """All project Python files pass ruff linting."""
-    result = subprocess.run(
-        [_ruff_executable(), "check", "--extend-exclude", "venv", "."],
-        cwd=ROOT,
-        capture_output=True,
-        text=True,
+
+def _tree_fingerprint(stamps: dict[str, str], fingerprint: dict) -> str:
+    # One digest over every (path, content hash) pair plus the ruff build and config
+    digest = hashlib.blake2b(json.dumps(fingerprint, sort_keys=True).encode(), digest_size=16)
+    for path in sorted(stamps):
+        digest.update(f"{path}\0{stamps[path]}\n".encode())
+    return digest.hexdigest()
+
+
+def _run_ruff_batch(ruff: str, paths: list[str]) -> list[dict]:
+    # --force-exclude keeps the exclusions in effect for explicitly passed paths
+    command = [ruff, "check", "--extend-exclude", "venv", "--force-exclude", "--output-format=json", *paths]
+
+    # Most runs are clean, and then the exit code says all there is to say;
+    # output is only captured when a second run needs to report diagnostics.
+    if subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0:
+        return []
+
+    # Left as bytes: json.loads takes them directly, and stderr is only decoded to report a failure
+    result = subprocess.run(command, cwd=ROOT, capture_output=True)
+    # 0: clean, 1: diagnostics found, anything else: ruff itself failed
+    assert result.returncode in (0, 1), f"Ruff failed to run:\n{result.stderr.decode('utf-8', errors='replace')}"
+    return json.loads(result.stdout)
+
+
+def _balanced_batches(paths: list[str], count: int) -> list[list[str]]:
+    # Largest file first onto the batch with the fewest bytes so far (LPT), so runs finish together
+    batches = [[] for _ in range(count)]
+    loads = [(0, i) for i in range(count)]
+    sizes = {path: os.stat(ROOT / path).st_size for path in paths}
+    for path in sorted(paths, key=sizes.__getitem__, reverse=True):
+        load, i = heapq.heappop(loads)
+        batches[i].append(path)
+        heapq.heappush(loads, (load + sizes[path], i))
+    return batches
+
+
+def _run_ruff(ruff: str, paths: list[str]) -> list[dict]:
+    if len(paths) <= RUFF_BATCH_MIN_FILES:
+        return _run_ruff_batch(ruff, paths)
+
+    count = min(os.cpu_count() or 1, len(paths) // RUFF_FILES_PER_BATCH)
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        results = pool.map(functools.partial(_run_ruff_batch, ruff), _balanced_batches(paths, count))
+        return [d for diagnostics in results for d in diagnostics]
+
+
+def _format_diagnostics(diagnostics: list[dict]) -> str:
+    return "\n".join(
+        f"{Path(d['filename']).relative_to(ROOT)}:{d['location']['row']}:{d['location']['column']}: "
+        f"{d['code'] or 'syntax-error'} {d['message']}"
+        for d in diagnostics
     )
-    assert result.returncode == 0, f"Ruff found linting errors:\n{result.stdout}"
 
 
-def test_no_syntax_errors():
-    """All project Python files parse without syntax errors."""
-    errors = []
-    for path in _project_python_files():
-        try:
-            ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
-        except SyntaxError as exc:
-            errors.append(f"{path.relative_to(ROOT)}: {exc}")
+@pytest.fixture(scope="module")
+def ruff_diagnostics(pytestconfig) -> list[dict]:
+    """
+    Run ruff over the files that changed since the last run and return its JSON diagnostics.
+    Clean files are cached by content hash under the ruff build and config they were checked with,
+    and a tree identical to the last green run is not re-examined at all.
+    """
+    cache = getattr(pytestconfig, "cache", None)  # None when the cacheprovider plugin is disabled
+    ruff = _ruff_executable(cache)
+
+    stamps = _content_keys(_project_python_files())
+    fingerprint = _ruff_fingerprint(ruff)
+    tree = _tree_fingerprint(stamps, fingerprint)
+
+    # Identical to the last green run: a single comparison, no per-file cache to load
+    if cache is not None and cache.get(TREE_FINGERPRINT_CACHE_KEY, None) == tree:
+        return []
+
+    cached = cache.get(CLEAN_FILES_CACHE_KEY, {}) if cache is not None else {}
+    clean = cached.get("files", {}) if cached.get("fingerprint") == fingerprint else {}
+
+    to_check = [path for path, stamp in stamps.items() if clean.get(path) != stamp]
+    diagnostics = _run_ruff(ruff, to_check) if to_check else []
+
+    if cache is not None:
+        # Only files without diagnostics are cached, so flagged files are re-reported every run
+        flagged = {str(Path(d["filename"]).relative_to(ROOT)) for d in diagnostics}
+        cache.set(CLEAN_FILES_CACHE_KEY, {
+            "fingerprint": fingerprint,
+            "files": {path: stamp for path, stamp in stamps.items() if path not in flagged},
+        })
+        cache.set(TREE_FINGERPRINT_CACHE_KEY, None if diagnostics else tree)
+    return diagnostics
+
+
+def test_ruff_no_linting_errors(ruff_diagnostics):
+    """All project Python files parse and pass ruff linting."""
+    syntax_errors = [d for d in ruff_diagnostics if d["code"] in SYNTAX_ERROR_CODES]
+    assert not syntax_errors, "Syntax errors found:\n" + _format_diagnostics(syntax_errors)
 
-    assert not errors, "Syntax errors found:\n" + "\n".join(errors)
+    errors = [d for d in ruff_diagnostics if d["code"] not in SYNTAX_ERROR_CODES]
+    assert not errors, f"Ruff found linting errors:\n{_format_diagnostics(errors)}"
@@ -0,0 +1,98 @@
+"""
+Checks the request body batch_update_report_status puts on the wire. Requests
+are answered from a before-send hook, so no AWS call is made; the hook sees the
+body after the resource's own serialization, which Stubber's parameter check
+runs ahead of.
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from botocore.awsrequest import AWSResponse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+import repository  # noqa: E402
+from models import Status  # noqa: E402
+
+
+class _EmptyBody:
+    def stream(self, **kwargs):
+        yield b"{}"
+
+
+@pytest.fixture
+def sent_bodies():
+    bodies = []
+
+    def respond(request, **kwargs):
+        bodies.append(json.loads(request.body))
+        return AWSResponse(request.url, 200, {}, _EmptyBody())
+
+    events = repository.dynamodb.meta.client.meta.events
+    events.register("before-send.dynamodb.TransactWriteItems", respond)
+    yield bodies
+    events.unregister("before-send.dynamodb.TransactWriteItems", respond)
+
+
+def _update_action(report_id: int, value_attrs: dict, update_expr: str) -> dict:
+    return {
+        "Update": {
+            "TableName": repository.TABLE_NAME,
+            "Key": {"report_id": {"N": str(report_id)}, "batch_no": {"N": "7"}},
+            "UpdateExpression": update_expr,
+            "ExpressionAttributeNames": {"#status": "status"},
+            "ExpressionAttributeValues": value_attrs,
+        }
+    }
+
+
+def test_batch_update_sends_singly_serialized_attributes(sent_bodies, monkeypatch):
+    class FixedDatetime:
+        @staticmethod
+        def now():
+            return FixedDatetime()
+
+        def isoformat(self):
+            return "2024-01-01T00:00:00"
+
+    monkeypatch.setattr(repository, "datetime", FixedDatetime)
+    updated_at = {"S": "2024-01-01T00:00:00"}
+
+    repository.batch_update_report_status([
+        {"report_id": 1, "batch_no": 7, "status": Status.FINISHED, "s3_key": "reports/1.pdf"},
+        {"report_id": 2, "batch_no": 7, "status": Status.FAILED, "error_msg": "boom"},
+    ])
+
+    # ClientRequestToken is filled in by botocore, so only the items are compared
+    assert [body["TransactItems"] for body in sent_bodies] == [
+        [
+            _update_action(
+                1,
+                {":status": {"S": "FINISHED"}, ":updated_at": updated_at, ":s3_key": {"S": "reports/1.pdf"}},
+                repository._STATUS_UPDATE_EXPRS[(True, False)],
+            ),
+            _update_action(
+                2,
+                {":status": {"S": "FAILED"}, ":updated_at": updated_at, ":error_msg": {"S": "boom"}},
+                repository._STATUS_UPDATE_EXPRS[(False, True)],
+            ),
+        ]
+    ]
+
+
+def test_batch_update_splits_at_transaction_limit(sent_bodies):
+    updates = [
+        {"report_id": i, "batch_no": 7, "status": Status.QUEUED}
+        for i in range(repository.TRANSACT_MAX_ITEMS + 1)
+    ]
+
+    repository.batch_update_report_status(updates)
+
+    assert [len(body["TransactItems"]) for body in sent_bodies] == [repository.TRANSACT_MAX_ITEMS, 1]